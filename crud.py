@@ -1,9 +1,10 @@
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from sqlalchemy.orm import Session
 
 import models
 import schemas
+from utils import refresh_exchange_cache
 
 
 def create_or_update_channel(db: Session, channel: schemas.ChannelCreate):
@@ -11,6 +12,12 @@ def create_or_update_channel(db: Session, channel: schemas.ChannelCreate):
         db.query(models.Channel).filter(models.Channel.name == channel.name).first()
     )
     if db_channel:
+        # Re-adding a channel forces it to be resolved again, e.g. after its
+        # username moved to another channel or the stored ID stopped working
+        db_channel.telegram_id = None
+        db_channel.access_hash = None
+        db.commit()
+        db.refresh(db_channel)
         return db_channel
     new_channel = models.Channel(name=channel.name)
     db.add(new_channel)
@@ -20,9 +27,7 @@ def create_or_update_channel(db: Session, channel: schemas.ChannelCreate):
 
 
 def delete_channel(db: Session, channel_id: int):
-    db_channel = (
-        db.query(models.Channel).filter(models.Channel.id == channel_id).first()
-    )
+    db_channel = db.get(models.Channel, channel_id)
     if db_channel:
         db.delete(db_channel)
         db.commit()
@@ -38,16 +43,16 @@ def create_or_update_exchange(db: Session, exchange: schemas.ExchangeCreate):
     db.add(new_exchange)
     db.commit()
     db.refresh(new_exchange)
+    refresh_exchange_cache(db)
     return new_exchange
 
 
 def delete_exchange(db: Session, exchange_id: int):
-    db_exchange = (
-        db.query(models.Exchange).filter(models.Exchange.id == exchange_id).first()
-    )
+    db_exchange = db.get(models.Exchange, exchange_id)
     if db_exchange:
         db.delete(db_exchange)
         db.commit()
+        refresh_exchange_cache(db)
 
 
 def get_all_channels(db: Session) -> List[models.Channel]:
@@ -57,7 +62,18 @@ def get_all_channels(db: Session) -> List[models.Channel]:
 
 def get_channel_by_id(db: Session, channel_id: int) -> Optional[models.Channel]:
     """Get specific channel by ID"""
-    return db.query(models.Channel).filter(models.Channel.id == channel_id).first()
+    return db.get(models.Channel, channel_id)
+
+
+def save_channel_entities(
+    db: Session, entities: Dict[str, Tuple[int, Optional[int]]]
+):
+    """Store resolved Telegram (id, access_hash) pairs keyed by channel name"""
+    for channel in db.query(models.Channel).filter(
+        models.Channel.name.in_(list(entities))
+    ):
+        channel.telegram_id, channel.access_hash = entities[channel.name]
+    db.commit()
 
 
 def get_all_exchanges(db: Session) -> List[models.Exchange]:
@@ -67,7 +83,7 @@ def get_all_exchanges(db: Session) -> List[models.Exchange]:
 
 def get_exchange_by_id(db: Session, exchange_id: int) -> Optional[models.Exchange]:
     """Get specific exchange by ID"""
-    return db.query(models.Exchange).filter(models.Exchange.id == exchange_id).first()
+    return db.get(models.Exchange, exchange_id)
 
 
 def create_token(db: Session, token: schemas.TokenCreate):
@@ -80,10 +96,27 @@ def create_token(db: Session, token: schemas.TokenCreate):
     )
     db.add(db_token)
     db.commit()
-    db.refresh(db_token)
     return db_token
 
 
+def create_tokens_bulk(
+    db: Session, tokens: List[schemas.TokenCreate]
+) -> List[models.Token]:
+    """Create several token listing entries in a single transaction"""
+    db_tokens = [
+        models.Token(
+            token=token.token,
+            exchange=token.exchange,
+            market=token.market,
+            timestamp=token.timestamp,
+        )
+        for token in tokens
+    ]
+    db.add_all(db_tokens)
+    db.commit()
+    return db_tokens
+
+
 def get_all_tokens(db: Session) -> List[models.Token]:
     """Get all tokens from database"""
     return db.query(models.Token).order_by(models.Token.timestamp.desc()).all()
@@ -91,15 +124,18 @@ def get_all_tokens(db: Session) -> List[models.Token]:
 
 def get_token_by_id(db: Session, token_id: int) -> Optional[models.Token]:
     """Get specific token by ID"""
-    return db.query(models.Token).filter(models.Token.id == token_id).first()
+    return db.get(models.Token, token_id)
 
 
-def get_tokens_by_exchange(db: Session, exchange: str) -> List[models.Token]:
-    """Get all tokens for a specific exchange"""
+def get_tokens_by_exchange(
+    db: Session, exchange: str, limit: int = 10
+) -> List[models.Token]:
+    """Get the most recent tokens for a specific exchange"""
     return (
         db.query(models.Token)
         .filter(models.Token.exchange == exchange)
         .order_by(models.Token.timestamp.desc())
+        .limit(limit)
         .all()
     )
 
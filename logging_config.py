@@ -1,22 +1,56 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
 import sys
 
+from termcolor import colored
+
 logger = None
+queue_listener = None
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+class ColorFormatter(logging.Formatter):
+    """Color console log lines by level"""
+
+    COLORS = {
+        "INFO": "green",
+        "WARNING": "yellow",
+        "ERROR": "red",
+    }
+
+    def format(self, record):
+        return colored(super().format(record), self.COLORS.get(record.levelname, "white"))
+
 
 def setup_logging():
-    global logger
+    global logger, queue_listener
     # Create logs directory if it doesn't exist
     os.makedirs("logs", exist_ok=True)
-    
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        handlers=[
-            logging.StreamHandler(sys.stdout),
-            logging.FileHandler("logs/app.log")
-        ],
-    )
+
+    if queue_listener is None:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(ColorFormatter(LOG_FORMAT))
+        file_handler = logging.FileHandler("logs/app.log")
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+        # Callers only enqueue records; a background thread does the writes,
+        # so console and disk I/O stay off the event loop
+        log_queue = queue.Queue(-1)
+        queue_listener = logging.handlers.QueueListener(
+            log_queue, console_handler, file_handler
+        )
+        queue_listener.start()
+        atexit.register(queue_listener.stop)
+
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        # Only merge the message here; the listener's handlers add the prefix
+        queue_handler.setFormatter(logging.Formatter("%(message)s"))
+
+        logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
     
     logger = logging.getLogger("telegram_classifier")
     return logger
@@ -6,6 +6,7 @@ from typing import List, Optional
 from dotenv import load_dotenv
 from fastapi import Depends, FastAPI, HTTPException, Query, Request, status
 from fastapi.responses import JSONResponse
+from sqlalchemy import inspect, text
 from sqlalchemy.orm import Session
 
 import crud
@@ -21,6 +22,18 @@ load_dotenv()
 # Initialize FastAPI and create database tables
 app = FastAPI(title="Telegram Token Tracker")
 models.Base.metadata.create_all(bind=engine)
+# create_all skips existing tables, so add any new indexes explicitly
+for index in models.Token.__table__.indexes:
+    index.create(bind=engine, checkfirst=True)
+# The exchange-only index is covered by ix_tokens_exchange_ts
+with engine.begin() as connection:
+    connection.execute(text("DROP INDEX IF EXISTS ix_tokens_exchange"))
+# ...and any columns added to existing tables
+channel_columns = {column["name"] for column in inspect(engine).get_columns("channels")}
+with engine.begin() as connection:
+    for column in ("telegram_id", "access_hash"):
+        if column not in channel_columns:
+            connection.execute(text(f"ALTER TABLE channels ADD COLUMN {column} BIGINT"))
 
 # Setup logging
 logger = setup_logging()
@@ -100,7 +113,8 @@ async def add_channel(channel: schemas.ChannelCreate, db: Session = Depends(get_
     try:
         result = crud.create_or_update_channel(db, channel)
         if telegram_listener and telegram_listener.is_running:
-            await telegram_listener.update_monitored_channels()
+            telegram_listener.evict_channel(channel.name)
+            telegram_listener.schedule_channel_update()
         return result
     except Exception as e:
         logging.error(f"Error adding channel: {e}")
@@ -201,8 +215,7 @@ def get_tokens(
     """
     try:
         if exchange:
-            tokens = crud.get_tokens_by_exchange(db, exchange)
-            return tokens[:limit]  # Apply limit after filtering
+            return crud.get_tokens_by_exchange(db, exchange, limit)
         else:
             return crud.get_latest_tokens(db, limit)
     except Exception as e:
@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, Integer, String
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, String
 
 from database import Base
 
@@ -9,6 +9,9 @@ class Channel(Base):
     __tablename__ = "channels"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True)
+    # Filled in the first time the channel is resolved, so restarts skip get_entity
+    telegram_id = Column(BigInteger, nullable=True)
+    access_hash = Column(BigInteger, nullable=True)
 
 
 class Exchange(Base):
@@ -21,6 +24,12 @@ class Token(Base):
     __tablename__ = "tokens"
     id = Column(Integer, primary_key=True, index=True)
     token = Column(String, index=True)
-    exchange = Column(String, index=True)
+    exchange = Column(String)
     market = Column(String)
     timestamp = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Serves "by exchange, newest first" without a sort step
+        Index("ix_tokens_exchange_ts", "exchange", timestamp.desc()),
+        Index("ix_tokens_ts", timestamp.desc()),
+    )
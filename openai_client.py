@@ -1,31 +1,95 @@
+import asyncio
+import copy
+import hashlib
 import json
 import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
 
-from openai import OpenAI
+from openai import AsyncOpenAI
+
+# Seconds to wait for a classification before giving up on the request
+REQUEST_TIMEOUT = 30.0
+
+# Seconds a cached classification stays valid
+CACHE_TTL = 3600
 
 
 class OpenAIClient:
-    def __init__(self, api_key: str):
-        self.client = OpenAI()
+    def __init__(
+        self,
+        api_key: str,
+        cache_size: int = 10_000,
+        cache_ttl: float = CACHE_TTL,
+        max_concurrency: int = 5,
+    ):
+        # The SDK default (10 minutes) would stall a chat's worker on a hung request
+        self.client = AsyncOpenAI(timeout=REQUEST_TIMEOUT)
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        # Digest of the message -> (expiry time, parsed tokens)
+        self._cache: "OrderedDict[bytes, Tuple[float, list]]" = OrderedDict()
+        self._pending: Dict[bytes, asyncio.Task] = {}
+        # Caps real API calls only; cache hits and shared requests don't take a slot
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def classify_message(self, message: str) -> list:
+        """Classify a message, reusing the result for repeated announcements"""
+        key = hashlib.blake2b(message.strip().encode(), digest_size=16).digest()
+        cached = self._cache.get(key)
+        if cached is not None:
+            expires_at, tokens = cached
+            if expires_at > time.monotonic():
+                self._cache.move_to_end(key)
+                logging.info("OpenAI cache hit, skipping request")
+                return copy.deepcopy(tokens)
+            del self._cache[key]
+
+        # Mirrored channels post the same text at once; share the in-flight request
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.create_task(self._request_classification(message))
+            self._pending[key] = task
+            task.add_done_callback(lambda done: self._finish_request(key, done))
+
+        # Shielded so a cancelled caller doesn't cancel the request for the others
+        result = await asyncio.shield(task)
+        return copy.deepcopy(result) if result is not None else []
+
+    def _finish_request(self, key: bytes, task: asyncio.Task):
+        """Drop a finished request from the in-flight map and cache its answer"""
+        del self._pending[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        result = task.result()
+        if result is None:
+            return
+
+        self._cache[key] = (time.monotonic() + self.cache_ttl, result)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
 
-    def classify_message(self, message: str) -> list:
+    async def _request_classification(self, message: str) -> Optional[list]:
+        """Send the message to OpenAI; returns None when no usable answer came back"""
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4-1106-preview",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": 'you are a classifier function. You will receive a message that might contain which token or tokens is listed or going to be listed or launched on spot or future perpetuals on which exchange on spot or future. the message might not even talk about token listing so don\'t give false positives. The message might also talk about token being removed or delisted, do not include them. Your job is to identify name of the token or tokens (without USDT) make sure you DO NOT include USDT. If there is numbers before the token name, return only the token name, example: 1000000MOGUSDT should be MOG. return only JSON in ARRAY , NO TALKING. if the message doesn\'t talk about a token being listed, return []. if 1 token, return for example [{"token": "ABCD","exchange": "binance","market": "future"}] . if two or more tokens, put them in the array.',
-                    },
-                    {"role": "user", "content": message},
-                ],
-                temperature=1,
-                max_tokens=2048,
-                top_p=1,
-                frequency_penalty=0,
-                presence_penalty=0,
-                response_format={"type": "text"},
-            )
+            async with self._semaphore:
+                response = await self.client.chat.completions.create(
+                    model="gpt-4-1106-preview",
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": 'you are a classifier function. You will receive a message that might contain which token or tokens is listed or going to be listed or launched on spot or future perpetuals on which exchange on spot or future. the message might not even talk about token listing so don\'t give false positives. The message might also talk about token being removed or delisted, do not include them. Your job is to identify name of the token or tokens (without USDT) make sure you DO NOT include USDT. If there is numbers before the token name, return only the token name, example: 1000000MOGUSDT should be MOG. return only JSON in ARRAY , NO TALKING. if the message doesn\'t talk about a token being listed, return []. if 1 token, return for example [{"token": "ABCD","exchange": "binance","market": "future"}] . if two or more tokens, put them in the array.',
+                        },
+                        {"role": "user", "content": message},
+                    ],
+                    temperature=1,
+                    max_tokens=2048,
+                    top_p=1,
+                    frequency_penalty=0,
+                    presence_penalty=0,
+                    response_format={"type": "text"},
+                )
 
             result = response.choices[0].message.content
 
@@ -36,12 +100,12 @@ class OpenAIClient:
                 if isinstance(parsed_result, list):
                     return parsed_result
                 logging.error(f"Response is not a list: {result}")
-                return []
+                return None
             except json.JSONDecodeError as e:
                 logging.error(f"Failed to parse OpenAI response as JSON: {result}")
                 logging.error(f"JSON parse error: {str(e)}")
-                return []
+                return None
 
         except Exception as e:
             logging.error(f"Error in OpenAI request: {str(e)}")
-            return []
+            return None
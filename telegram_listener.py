@@ -3,11 +3,11 @@ import json
 import logging
 import os
 import sys
-import traceback
 from datetime import datetime
 from typing import List, Optional
 
 from dotenv import load_dotenv
+from sqlalchemy.orm import scoped_session
 from telethon import TelegramClient, events
 from telethon.errors import (
     AuthKeyUnregisteredError,
@@ -16,51 +16,67 @@ from telethon.errors import (
     SessionPasswordNeededError,
     UserDeactivatedError,
 )
-from termcolor import colored
+from telethon.tl.types import Channel, InputPeerChannel
 
 import crud
 import models
-from database import get_db_session
+from database import SessionLocal
 from openai_client import OpenAIClient
 from schemas import TokenCreate
-from utils import is_message_related_to_exchanges
+from utils import (
+    is_message_related_to_exchanges,
+    looks_like_listing,
+    refresh_exchange_cache,
+)
 from logging_config import setup_logging, logger
 
 # Load environment variables
 load_dotenv()
 
+TELEGRAM_API_ID = os.getenv("TELEGRAM_API_ID")
+TELEGRAM_API_HASH = os.getenv("TELEGRAM_API_HASH")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+SESSION_NAME = "data/telegram_session/telegram_session"
+
+# Maximum number of OpenAI requests in flight across all chats
+OPENAI_CONCURRENCY = 5
+
+# Maximum number of concurrent get_entity lookups
+ENTITY_CONCURRENCY = 5
+
+# Seconds to wait for further channel edits before refreshing
+CHANNEL_UPDATE_DELAY = 0.5
+
+
+def channel_peer(telegram_id: int, access_hash: Optional[int]):
+    """Peer for the chats filter; a bare ID when no access hash is stored"""
+    if access_hash is None:
+        return telegram_id
+    return InputPeerChannel(telegram_id, access_hash)
+
 
 class TelegramListener:
     def __init__(self, websocket_server=None):
         self.logger = logger or setup_logging()
-        self.api_id = os.getenv("TELEGRAM_API_ID")
-        self.api_hash = os.getenv("TELEGRAM_API_HASH")
-        self.session_name = "data/telegram_session/telegram_session"
+        self.api_id = TELEGRAM_API_ID
+        self.api_hash = TELEGRAM_API_HASH
+        self.session_name = SESSION_NAME
         self.client = None
-        self.openai_client = OpenAIClient(os.getenv("OPENAI_API_KEY"))
+        self.openai_client = OpenAIClient(
+            OPENAI_API_KEY, max_concurrency=OPENAI_CONCURRENCY
+        )
         self.is_running = False
-        self.channel_handlers = {}  # Store handlers for each channel
+        self.channel_ids = {}  # Resolved Telegram peer for each channel name
+        self.message_handler = None  # Single NewMessage handler for all channels
+        self.chat_queues = {}  # Pending events per chat, processed in order
+        self.chat_workers = {}  # Worker task draining each chat's queue
+        self.entity_semaphore = asyncio.Semaphore(ENTITY_CONCURRENCY)
+        self.channel_update_task = None  # Pending debounced channel refresh
+        self.channel_update_running = False  # Refresh past its delay, doing RPCs
+        self.channel_update_rerun = False  # Edits arrived while a refresh was running
+        self.db_session = scoped_session(SessionLocal)  # Reused across messages
         self.websocket_server = websocket_server
 
-    def log_message(self, level: str, message: str):
-        """Log a message with color and to file"""
-        color_map = {
-            "INFO": "green",
-            "WARNING": "yellow",
-            "ERROR": "red",
-        }
-        
-        # Console output with color
-        print(colored(f"{level}: {message}", color_map.get(level, "white")))
-        
-        # File logging
-        if level == "INFO":
-            self.logger.info(message)
-        elif level == "WARNING":
-            self.logger.warning(message)
-        elif level == "ERROR":
-            self.logger.error(message)
-
     async def handle_authentication(self):
         """Handle the complete Telegram authentication process"""
         try:
@@ -74,7 +90,7 @@ class TelegramListener:
                 await self.client.send_code_request(phone)
 
                 # Get verification code
-                self.log_message("INFO", "Verification code required")
+                self.logger.info("Verification code required")
                 verification_code = input(
                     "Please enter the verification code you received: "
                 )
@@ -83,47 +99,50 @@ class TelegramListener:
                     await self.client.sign_in(phone, verification_code)
                 except SessionPasswordNeededError:
                     # Handle 2FA
-                    self.log_message("INFO", "2FA password required")
+                    self.logger.info("2FA password required")
                     password = input("Please enter your 2FA password: ")
                     await self.client.sign_in(password=password)
 
-            self.log_message("INFO", "Successfully authenticated with Telegram")
+            self.logger.info("Successfully authenticated with Telegram")
             return True
 
         except Exception as e:
-            self.log_message("ERROR", f"Authentication error: {e}")
+            self.logger.error("Authentication error: %s", e)
             return False
 
     async def start(self):
         """Start the Telegram listener"""
         if self.is_running:
-            self.log_message("WARNING", "🚫 Telegram listener is already running")
+            self.logger.warning("🚫 Telegram listener is already running")
             return
 
         try:
             if not self.client:
-                self.log_message("INFO", "🔄 Creating new Telegram client...")
+                self.logger.info("🔄 Creating new Telegram client...")
                 self.client = TelegramClient(
                     self.session_name, self.api_id, self.api_hash
                 )
 
-            self.log_message("INFO", "🔌 Connecting to Telegram...")
+            self.logger.info("🔌 Connecting to Telegram...")
             await self.client.connect()
             
             if not await self.handle_authentication():
                 raise Exception("Authentication failed")
 
-            self.log_message("INFO", "🔄 Updating monitored channels...")
+            # Load the exchange filter up front so messages don't hit the database
+            refresh_exchange_cache(self.db_session())
+            self.db_session.commit()
+
+            self.logger.info("🔄 Updating monitored channels...")
             await self.update_monitored_channels()
             
             self.is_running = True
-            self.log_message("INFO", "🚀 Telegram listener started successfully")
+            self.logger.info("🚀 Telegram listener started successfully")
             
             await self.client.run_until_disconnected()
 
         except Exception as e:
-            self.log_message("ERROR", f"❌ Error in Telegram listener: {str(e)}")
-            self.log_message("ERROR", f"❌ Traceback: {traceback.format_exc()}")
+            self.logger.exception("❌ Error in Telegram listener: %s", e)
             self.is_running = False
             raise
 
@@ -132,7 +151,33 @@ class TelegramListener:
         if self.client:
             await self.client.disconnect()
             self.is_running = False
-            self.log_message("INFO", "Telegram listener stopped")
+            if self.channel_update_task:
+                self.channel_update_task.cancel()
+            for worker in self.chat_workers.values():
+                worker.cancel()
+            self.chat_workers.clear()
+            self.chat_queues.clear()
+            self.db_session.remove()
+            self.logger.info("Telegram listener stopped")
+
+    def enqueue_message(self, event):
+        """Queue an event on its chat's worker so slow chats don't hold up others"""
+        queue = self.chat_queues.get(event.chat_id)
+        if queue is None:
+            queue = self.chat_queues[event.chat_id] = asyncio.Queue()
+            self.chat_workers[event.chat_id] = asyncio.create_task(
+                self.chat_worker(queue)
+            )
+        queue.put_nowait(event)
+
+    async def chat_worker(self, queue: asyncio.Queue):
+        """Process one chat's events sequentially to preserve their order"""
+        while True:
+            event = await queue.get()
+            try:
+                await self.process_message(event)
+            finally:
+                queue.task_done()
 
     async def process_message(self, event):
         """Process incoming messages"""
@@ -141,86 +186,163 @@ class TelegramListener:
             if not message:
                 return
 
-            self.log_message("INFO", f"Message content preview: {message[:100]}")
-
-            # Use context manager for database session
-            with get_db_session() as db:
-                # Check for exchange names
-                if not is_message_related_to_exchanges(db, message):
-                    return
-
-                # Process with OpenAI
-                self.log_message("INFO", "🤖 Processing with OpenAI...")
-                tokens = self.openai_client.classify_message(message)
-
-                # Log OpenAI's response
-                self.log_message("INFO", f"🤖 OpenAI Response: {tokens}")
-
-                # Broadcast tokens via WebSocket if available
-                if self.websocket_server and tokens:
-                    await self.websocket_server.broadcast({
-                        "type": "tokens",
-                        "data": tokens
-                    })
-
-                if tokens:
-                    self.log_message("INFO", f"✅ Found token listing(s)! {tokens}")
-
-                    # Save tokens
-                    for token_data in tokens:
-                        token_create = TokenCreate(
-                            token=token_data["token"],
-                            exchange=token_data["exchange"],
-                            market=token_data["market"],
-                            timestamp=datetime.utcnow(),
-                        )
-                        saved_token = crud.create_token(db, token_create)
-                        self.log_message("INFO", f"💾 Saved token: {token_data['token']}")
-                else:
-                    self.log_message("WARNING", "❌ No tokens found in OpenAI response")
+            if self.logger.isEnabledFor(logging.INFO):
+                self.logger.info("Message content preview: %s", message[:100])
+
+            # Both filters below work on the same lowercased copy
+            message_lower = message.lower()
+
+            # The listener's long-lived session; no connection is held until a query runs
+            db = self.db_session()
+
+            # Check for exchange names
+            if not is_message_related_to_exchanges(db, message_lower):
+                return
+
+            # Skip OpenAI for exchange chatter that isn't about a listing
+            if not looks_like_listing(message_lower):
+                return
+
+            # Process with OpenAI
+            self.logger.info("🤖 Processing with OpenAI...")
+            tokens = await self.openai_client.classify_message(message)
+
+            # Log OpenAI's response
+            self.logger.info("🤖 OpenAI Response: %s", tokens)
+
+            # Broadcast tokens via WebSocket if available
+            if self.websocket_server and tokens:
+                await self.websocket_server.broadcast({
+                    "type": "tokens",
+                    "data": tokens
+                })
+
+            if tokens:
+                self.logger.info("✅ Found token listing(s)! %s", tokens)
+
+                # Save tokens in one transaction
+                now = datetime.utcnow()
+                token_creates = [
+                    TokenCreate(
+                        token=token_data["token"],
+                        exchange=token_data["exchange"],
+                        market=token_data["market"],
+                        timestamp=now,
+                    )
+                    for token_data in tokens
+                ]
+                crud.create_tokens_bulk(db, token_creates)
+                self.logger.info(
+                    "💾 Saved tokens: %s",
+                    ", ".join(token.token for token in token_creates),
+                )
+            else:
+                self.logger.warning("❌ No tokens found in OpenAI response")
 
         except Exception as e:
-            self.log_message("ERROR", f"❌ Error processing message: {str(e)}")
-            self.log_message("ERROR", f"❌ Error type: {type(e).__name__}")
-            self.log_message("ERROR", f"❌ Error details: {str(e)}")
-            self.log_message("ERROR", f"❌ Traceback: {traceback.format_exc()}")
+            self.logger.exception("❌ Error processing message: %s: %s", type(e).__name__, e)
+            self.db_session.rollback()
+
+    def schedule_channel_update(self):
+        """Refresh monitored channels shortly, coalescing rapid successive edits"""
+        if self.channel_update_running:
+            # Don't abort in-flight get_entity RPCs; refresh once more afterwards
+            self.channel_update_rerun = True
+            return
+        if self.channel_update_task and not self.channel_update_task.done():
+            # Still in its delay, so nothing is lost by restarting it
+            self.channel_update_task.cancel()
+        self.channel_update_task = asyncio.create_task(self.debounced_channel_update())
+
+    async def debounced_channel_update(self):
+        await asyncio.sleep(CHANNEL_UPDATE_DELAY)
+        self.channel_update_running = True
+        try:
+            while True:
+                self.channel_update_rerun = False
+                try:
+                    await self.update_monitored_channels()
+                except Exception:
+                    pass  # Already logged by update_monitored_channels
+                if not self.channel_update_rerun:
+                    break
+        finally:
+            self.channel_update_running = False
+
+    async def resolve_channel(self, channel_name: str):
+        """Resolve a channel entity, capping concurrent lookups to avoid FloodWait"""
+        async with self.entity_semaphore:
+            return await self.client.get_entity(channel_name)
 
     async def update_monitored_channels(self):
         """Update the list of monitored channels"""
         try:
-            with get_db_session() as db:
-                channels = crud.get_all_channels(db)
-                
-                # Get channel entities and their IDs
-                for channel in channels:
-                    try:
-                        entity = await self.client.get_entity(channel.name)
-                        channel_id = entity.id
-                        self.log_message("INFO", f"Channel {channel.name} has ID: {channel_id}")
-                        
-                        # Remove old handler if exists
-                        if channel.name in self.channel_handlers:
-                            self.client.remove_event_handler(self.channel_handlers[channel.name])
-                            del self.channel_handlers[channel.name]
-                        
-                        # Create new handler for this channel
-                        @self.client.on(events.NewMessage(chats=[channel_id]))
-                        async def handler(event):
-                            await self.process_message(event)
-                        
-                        # Store handler reference
-                        self.channel_handlers[channel.name] = handler
-                        
-                    except Exception as e:
-                        self.log_message("ERROR", f"Failed to get entity for channel {channel.name}: {str(e)}")
+            db = self.db_session()
+            stored_entities = {
+                channel.name: (channel.telegram_id, channel.access_hash)
+                for channel in crud.get_all_channels(db)
+            }
+            db.commit()  # Release the connection before the entity RPCs
+            
+            # Use peers stored by earlier runs or resolved earlier in this one
+            channel_ids = {}
+            for name, (telegram_id, access_hash) in stored_entities.items():
+                if telegram_id is not None:
+                    channel_ids[name] = channel_peer(telegram_id, access_hash)
+                elif name in self.channel_ids:
+                    channel_ids[name] = self.channel_ids[name]
+
+            # Resolve the rest and store them for the next start
+            unresolved = [name for name in stored_entities if name not in channel_ids]
+            entities = await asyncio.gather(
+                *(self.resolve_channel(name) for name in unresolved),
+                return_exceptions=True,
+            )
+            resolved = {}
+            for channel_name, entity in zip(unresolved, entities):
+                if isinstance(entity, Exception):
+                    self.logger.error("Failed to get entity for channel %s: %s", channel_name, entity)
+                    continue
+                # Only channels are addressed by InputPeerChannel; keep the bare ID otherwise
+                access_hash = entity.access_hash if isinstance(entity, Channel) else None
+                channel_ids[channel_name] = channel_peer(entity.id, access_hash)
+                resolved[channel_name] = (entity.id, access_hash)
+                self.logger.info("Channel %s has ID: %s", channel_name, entity.id)
+            if resolved:
+                crud.save_channel_entities(db, resolved)
+
+            self.channel_ids = channel_ids
+            self.register_message_handler()
 
         except Exception as e:
-            self.log_message("ERROR", f"Error updating monitored channels: {str(e)}")
+            self.logger.error("Error updating monitored channels: %s", e)
+            # The session is shared with the chat workers; don't leave it failed
+            self.db_session.rollback()
             raise
 
+    def register_message_handler(self):
+        """(Re)register one NewMessage handler covering every monitored channel"""
+        if self.message_handler:
+            self.client.remove_event_handler(self.message_handler)
+            self.message_handler = None
+
+        if not self.channel_ids:
+            return
+
+        @self.client.on(events.NewMessage(chats=list(self.channel_ids.values())))
+        async def handler(event):
+            self.enqueue_message(event)
+
+        self.message_handler = handler
+
+    def evict_channel(self, channel_name: str):
+        """Forget a channel's resolved peer so the next refresh looks it up again"""
+        # The current handler keeps listening on the old peer until that refresh
+        self.channel_ids.pop(channel_name, None)
+
     async def remove_channel_handler(self, channel_name: str):
-        """Remove event handler for a specific channel"""
-        if channel_name in self.channel_handlers:
-            self.client.remove_event_handler(self.channel_handlers[channel_name])
-            del self.channel_handlers[channel_name]
-            self.log_message("INFO", f"Removed handler for channel: {channel_name}")
+        """Stop listening to a specific channel"""
+        if channel_name in self.channel_ids:
+            del self.channel_ids[channel_name]
+            self.register_message_handler()
+            self.logger.info("Removed handler for channel: %s", channel_name)
@@ -1,8 +1,75 @@
+import os
+import re
+from typing import Optional, Pattern
+
+from dotenv import load_dotenv
+
 import models
 from sqlalchemy.orm import Session
 
+load_dotenv()
+
+# Words that appear in listing announcements; substring matches, tuned for recall.
+# Set LISTING_KEYWORDS to a comma-separated list to replace these.
+DEFAULT_LISTING_KEYWORDS = (
+    "list",
+    "launch",
+    "perpetual",
+    "futures",
+    "spot",
+    "trading pair",
+    "pre-market",
+    "will add",
+    "上线",  # zh-Hans: go live
+    "上線",  # zh-Hant: go live
+    "上架",  # zh: list
+    "永续",  # zh: perpetual
+    "现货",  # zh: spot
+    "合约",  # zh: contract
+    "상장",  # ko: listing
+    "上場",  # ja: listing
+    "листинг",  # ru: listing
+    "niêm yết",  # vi: listing
+)
+
+LISTING_KEYWORDS = [
+    keyword.strip().lower()
+    for keyword in (os.getenv("LISTING_KEYWORDS") or ",".join(DEFAULT_LISTING_KEYWORDS)).split(",")
+    if keyword.strip()
+] or list(DEFAULT_LISTING_KEYWORDS)
+
+_LISTING_RE = re.compile("|".join(re.escape(keyword) for keyword in LISTING_KEYWORDS))
+
+# Single matcher over all exchange names; None until first loaded from the database
+_EXCHANGE_RE: Optional[Pattern[str]] = None
+_exchanges_loaded = False
+
+
+def refresh_exchange_cache(db: Session) -> None:
+    """Rebuild the cached exchange matcher; call after exchanges change"""
+    global _EXCHANGE_RE, _exchanges_loaded
+    names = [exchange.name.lower() for exchange in db.query(models.Exchange).all()]
+    # An empty alternation would match every message
+    _EXCHANGE_RE = (
+        re.compile(
+            # Whole words only, so "okx" doesn't match inside "mokxyz"; ASCII word
+            # chars only, so CJK text directly next to a name still counts as a boundary
+            r"(?<!\w)(?:" + "|".join(re.escape(name) for name in names) + r")(?!\w)",
+            re.ASCII,
+        )
+        if names
+        else None
+    )
+    _exchanges_loaded = True
+
+
+def is_message_related_to_exchanges(db: Session, message_lower: str) -> bool:
+    """Check an already lowercased message for any configured exchange name"""
+    if not _exchanges_loaded:
+        refresh_exchange_cache(db)
+    return _EXCHANGE_RE is not None and _EXCHANGE_RE.search(message_lower) is not None
+
 
-def is_message_related_to_exchanges(db: Session, message: str) -> bool:
-    db_exchanges = db.query(models.Exchange).all()
-    exchange_names = [exchange.name.lower() for exchange in db_exchanges]
-    return any(exchange in message.lower() for exchange in exchange_names)
+def looks_like_listing(message_lower: str) -> bool:
+    """Cheap keyword check on an already lowercased message"""
+    return _LISTING_RE.search(message_lower) is not None
@@ -1,9 +1,13 @@
 import asyncio
-import json
 import logging
 from typing import Dict, Set
+import orjson
 import websockets
 
+# Health-check reply is constant, so encode it once (as text, like the other frames)
+HEALTH_CHECK_RESPONSE = orjson.dumps({"type": "health_check", "status": "healthy"}).decode()
+
+
 class WebSocketServer:
     def __init__(self, host: str = "0.0.0.0", port: int = 8765):
         self.host = host
@@ -16,8 +20,9 @@ class WebSocketServer:
         self.clients.add(websocket)
         self.logger.info(f"New client connected. Total clients: {len(self.clients)}")
 
-    async def unregister(self, websocket: websockets.WebSocketServerProtocol):
-        self.clients.remove(websocket)
+    def unregister(self, websocket: websockets.WebSocketServerProtocol):
+        # discard: a failed broadcast may already have dropped this client
+        self.clients.discard(websocket)
         self.logger.info(f"Client disconnected. Total clients: {len(self.clients)}")
 
     async def broadcast(self, message: dict):
@@ -25,34 +30,45 @@ class WebSocketServer:
             self.logger.warning("No clients connected to broadcast message")
             return
 
+        # Decoded so clients keep receiving text frames rather than binary ones
+        payload = orjson.dumps(message).decode()
+        # Snapshot so clients connecting during the sends don't affect the loop
+        clients = tuple(self.clients)
+        # Send to every client concurrently so one slow socket doesn't delay the rest
+        results = await asyncio.gather(
+            *(client.send(payload) for client in clients), return_exceptions=True
+        )
+
         disconnected_clients = set()
-        for client in self.clients:
-            try:
-                await client.send(json.dumps(message))
-            except websockets.exceptions.ConnectionClosed:
+        for client, result in zip(clients, results):
+            if isinstance(result, websockets.exceptions.ConnectionClosed):
                 disconnected_clients.add(client)
-            except Exception as e:
-                self.logger.error(f"Error broadcasting message: {e}")
+            elif isinstance(result, Exception):
+                self.logger.error(f"Error broadcasting message: {result}")
                 disconnected_clients.add(client)
 
         # Remove disconnected clients
-        for client in disconnected_clients:
-            await self.unregister(client)
+        if disconnected_clients:
+            self.clients -= disconnected_clients
+            self.logger.info(
+                f"Removed {len(disconnected_clients)} disconnected client(s). "
+                f"Total clients: {len(self.clients)}"
+            )
 
     async def handle_client(self, websocket: websockets.WebSocketServerProtocol):
         await self.register(websocket)
         try:
             async for message in websocket:
                 try:
-                    data = json.loads(message)
+                    data = orjson.loads(message)
                     if data.get("type") == "health_check":
-                        await websocket.send(json.dumps({"type": "health_check", "status": "healthy"}))
-                except json.JSONDecodeError:
+                        await websocket.send(HEALTH_CHECK_RESPONSE)
+                except orjson.JSONDecodeError:
                     self.logger.error(f"Invalid JSON received: {message}")
                 except Exception as e:
                     self.logger.error(f"Error handling message: {e}")
         finally:
-            await self.unregister(websocket)
+            self.unregister(websocket)
 
     async def start(self):
         self.server = await websockets.serve(self.handle_client, self.host, self.port)